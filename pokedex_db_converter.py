@@ -4,14 +4,40 @@ pokedex_scraper.py and puts them into a sqlite database.
 from pymongo import MongoClient
 import sqlite3
 
+INSERT_POKEMON_SQL = "INSERT INTO pokemon VALUES (?, ?);"
+INSERT_FORMES_SQL = "INSERT INTO formes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);"
+INSERT_FORM_DESCRIPTIONS_SQL = ("INSERT INTO form_descriptions "
+                                "VALUES (?, ?, ?);")
+INSERT_ABILITIES_SQL = "INSERT INTO abilities VALUES (?, ?);"
+INSERT_FORM_ABILITIES_SQL = "INSERT INTO form_abilities VALUES (?, ?, ?);"
+INSERT_EVOLUTIONS_SQL = "INSERT INTO evolutions VALUES (?, ?);"
 
-def create_sqlite_db(db_name):
-    ''' Create a Pokedex sqlite database and its tables.'''
+
+def connect_sqlite_db(db_name):
+    '''Open a connection to the sqlite database tuned for bulk loading.'''
     con = sqlite3.connect(db_name)
+    # The database is rebuilt from mongodb whenever it's needed, so
+    # durability can be traded for write speed. Unlike WAL, the memory
+    # journal isn't saved in the database file, so the finished
+    # database can still be opened from a read-only location.
+    con.executescript('''PRAGMA journal_mode=MEMORY;
+                         PRAGMA synchronous=OFF;
+                         PRAGMA temp_store=MEMORY;
+                         PRAGMA cache_size=-64000;''')
+    return con
+
+
+def create_sqlite_db(db_name):
+    ''' Create a Pokedex sqlite database and its tables.
+
+    The tables' keys are left to create_sqlite_indexes so that
+    they're built once after fill_sqlite_db loads the data.
+    '''
+    con = connect_sqlite_db(db_name)
     cur = con.cursor()
 
     sql = '''CREATE TABLE pokemon(
-                name TEXT NOT NULL PRIMARY KEY,
+                name TEXT NOT NULL,
                 number INTEGER NOT NULL
             );'''
     cur.execute(sql)
@@ -26,7 +52,6 @@ def create_sqlite_db(db_name):
                 type_2 TEXT,
                 male INTEGER NOT NULL,
                 female INTEGER NOT NULL,
-                PRIMARY KEY(pokemon, form),
                 FOREIGN KEY(pokemon) REFERENCES pokemon(name)
             );'''
     cur.execute(sql)
@@ -35,13 +60,12 @@ def create_sqlite_db(db_name):
                 pokemon TEXT NOT NULL,
                 form TEXT NOT NULL,
                 description TEXT NOT NULL,
-                PRIMARY KEY(pokemon, form, description),
                 FOREIGN KEY(pokemon, form) REFERENCES formes(pokemon, form)
             );'''
     cur.execute(sql)
 
     sql = '''CREATE TABLE abilities(
-                ability TEXT NOT NULL PRIMARY KEY,
+                ability TEXT NOT NULL,
                 info TEXT NOT NULL
             );'''
     cur.execute(sql)
@@ -50,7 +74,6 @@ def create_sqlite_db(db_name):
                 pokemon TEXT NOT NULL,
                 form TEXT NOT NULL,
                 ability TEXT NOT NULL,
-                PRIMARY KEY(pokemon, form, ability),
                 FOREIGN KEY(pokemon, form) REFERENCES formes(pokemon, form),
                 FOREIGN KEY(ability) REFERENCES abilities(ability)
             );'''
@@ -59,7 +82,6 @@ def create_sqlite_db(db_name):
     sql = '''CREATE TABLE evolutions(
                 pokemon TEXT NOT NULL,
                 evolves_to TEXT NOT NULL,
-                PRIMARY KEY(pokemon, evolves_to),
                 FOREIGN KEY(pokemon) REFERENCES pokemon(name),
                 FOREIGN KEY(evolves_to) REFERENCES pokemon(name)
             );'''
@@ -68,100 +90,108 @@ def create_sqlite_db(db_name):
     con.close()
 
 
-def insert_pokemon_table(cur, pkmn):
-    '''Insert a pokemon's name and number into the pokemon table.'''
-    values = (pkmn['name'], pkmn['number'])
-    print(values)
-    cur.execute("INSERT INTO pokemon VALUES (?, ?);", values)
+def create_sqlite_indexes(con):
+    '''Create the unique indexes that key the Pokedex sqlite tables.
+
+    Building each index in one go after the tables are filled is
+    faster than updating it on every insert. It's run inside the
+    transaction that fills the tables so that a duplicate row rolls
+    the whole load back.
+    '''
+    # executescript() would commit the open transaction first,
+    # so run the statements one at a time.
+    for sql in ('''CREATE UNIQUE INDEX pokemon_key ON pokemon(name);''',
+                '''CREATE UNIQUE INDEX formes_key ON formes(pokemon, form);''',
+                '''CREATE UNIQUE INDEX form_descriptions_key
+                    ON form_descriptions(pokemon, form, description);''',
+                '''CREATE UNIQUE INDEX abilities_key ON abilities(ability);''',
+                '''CREATE UNIQUE INDEX form_abilities_key
+                    ON form_abilities(pokemon, form, ability);''',
+                '''CREATE UNIQUE INDEX evolutions_key
+                    ON evolutions(pokemon, evolves_to);'''):
+        con.execute(sql)
+
 
+def pokemon_table_values(pkmn):
+    '''Get a pokemon's name and number for the pokemon table.'''
+    return (pkmn['name'], pkmn['number'])
 
-def insert_formes_table(cur, pkmn):
-    '''Insert the details of each form of a pokemon into the formes table.'''
+
+def formes_table_values(pkmn):
+    '''Get the details of each form of a pokemon for the formes table.'''
+    values = []
     for form in pkmn['formes']:
         type1 = form['types'][0]
         type2 = None if len(form['types']) < 2 else form['types'][1]
         male = 1 if 'Male' in form['gender'] else 0
         female = 1 if 'Female' in form['gender'] else 0
-        values = (pkmn['name'], form['form'], form['height'], form['weight'],
-                    form['category'], type1, type2, male, female)
-        cur.execute("INSERT INTO formes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
-                    values)
+        values.append((pkmn['name'], form['form'], form['height'],
+                       form['weight'], form['category'], type1, type2,
+                       male, female))
+    return values
 
 
-def insert_form_descriptions_table(cur, pkmn):
-    '''Insert blurbs about each form of a pokemon into the 
+def form_descriptions_table_values(pkmn):
+    '''Get the blurbs about each form of a pokemon for the 
     form_descriptions table.
     '''
+    values = []
     for form in pkmn['formes']:
-        desc1 = form['descriptions'][0]
-        values = [(pkmn['name'], form['form'], desc1)]
         # Each form has 2 descriptions. But they might be the same and
-        # break the database's unique constraint.
-        desc2 = form['descriptions'][1]
-        if desc1 != desc2:
-            values.append((pkmn['name'], form['form'], desc2))
-        cur.executemany("INSERT INTO form_descriptions VALUES (?, ?, ?);",
-                        values)
-
-
-def insert_abilities_table(cur, ability):
-    '''Insert an ability and its description into the abilities table.'''
-    # Check if the ability is already in the database.
-    cur.execute("SELECT * FROM abilities WHERE ability=?;",
-                (ability['ability'],))
-    if len(cur.fetchall()) == 0:
-        # Insert the ability.
-        name = ability['ability']
-        info = ability['description']
-        cur.execute("INSERT INTO abilities VALUES(?, ?);", (name, info))
-
-
-def insert_form_abilities_table(cur, pkmn):
-    '''Insert the abilities that each form of a pokemon can have into 
+        # break the database's unique index.
+        for description in dict.fromkeys(form['descriptions']):
+            values.append((pkmn['name'], form['form'], description))
+    return values
+
+
+def form_abilities_table_values(pkmn):
+    '''Get the abilities that each form of a pokemon can have for 
     the form_abilities table.
     '''
     values = []
     for form in pkmn['formes']:
-        if 'abilities' in form.keys(): # One pokemon doesn't have abilities.
+        if 'abilities' in form: # One pokemon doesn't have abilities.
             for ability in form['abilities']:
                 values.append((pkmn['name'], form['form'], ability))
-    cur.executemany("INSERT INTO form_abilities VALUES (?, ?, ?);", values)
-
-
-def insert_evolutions_table(cur, pkmn):
-    '''Insert the evolution line of this pokemon into the evolutions table.'''
-    # Check if this pokemon's evolution line is already in the database.
-    cur.execute("SELECT * FROM evolutions WHERE pokemon=? OR evolves_to=?;",
-                (pkmn['name'], pkmn['name']))
-    if len(cur.fetchall()) == 0:
-        # Add the pokemon's evolutions to the database.
-        values = []
-        evos_list = pkmn['evolutions']
-        # Combine the dictionaries in evos_list into one dictionary.
-        evos = {}
-        for dic in evos_list:
-            evos.update(dic)
-        # I think first, middle, and last are the only possible 
-        # evolution spots. But I'm going to make sure with an assertion.
-        for key in evos.keys():
-            assert key in ['first', 'middle', 'last'], \
-                    "Unknown evolution spot: " + key
-        # If there are "middle" pokemon, then "first" evolves into
-        # "middle", and "middle" evolves into "last".
-        if 'middle' in evos.keys():
+    return values
+
+
+def evolution_family(pkmn):
+    '''Get the names of every pokemon in this pokemon's evolution line.
+
+    The pokemon in the same evolution line share the same family.
+    '''
+    return tuple(sorted(name for spot in pkmn['evolutions']
+                        for names in spot.values() for name in names))
+
+
+def evolutions_table_values(pkmn):
+    '''Get the evolution line of this pokemon for the evolutions table.'''
+    values = []
+    evos_list = pkmn['evolutions']
+    # Combine the dictionaries in evos_list into one dictionary.
+    evos = {spot: names for dic in evos_list for spot, names in dic.items()}
+    # I think first, middle, and last are the only possible 
+    # evolution spots. But I'm going to make sure with an assertion.
+    for key in evos:
+        assert key in ['first', 'middle', 'last'], \
+                "Unknown evolution spot: " + key
+    # If there are "middle" pokemon, then "first" evolves into
+    # "middle", and "middle" evolves into "last".
+    if 'middle' in evos:
+        for mid_evo in evos['middle']:
+            for first_evo in evos['first']:
+                values.append((first_evo, mid_evo))
+        for last_evo in evos['last']:
             for mid_evo in evos['middle']:
-                for first_evo in evos['first']:
-                    values.append((first_evo, mid_evo))
-            for last_evo in evos['last']:
-                for mid_evo in evos['middle']:
-                    values.append((mid_evo, last_evo))
-        # If there are "last" pokemon but no "middle",
-        # then "first" evolves into "last".
-        elif 'last' in evos.keys():
-            for last_evo in evos['last']:
-                for first_evo in evos['first']:
-                    values.append((first_evo, last_evo))
-        cur.executemany("INSERT INTO evolutions VALUES (?, ?);", values)
+                values.append((mid_evo, last_evo))
+    # If there are "last" pokemon but no "middle",
+    # then "first" evolves into "last".
+    elif 'last' in evos:
+        for last_evo in evos['last']:
+            for first_evo in evos['first']:
+                values.append((first_evo, last_evo))
+    return values
 
 
 def fill_sqlite_db(db_name):
@@ -171,17 +201,56 @@ def fill_sqlite_db(db_name):
     pkmn_coll = db.pokemon
     ability_coll = db.abilities
 
-    con = sqlite3.connect(db_name)
-    cur = con.cursor()
-    for ability in ability_coll.find():
-        insert_abilities_table(cur, ability)
-    for pkmn in pkmn_coll.find():
-        insert_pokemon_table(cur, pkmn)
-        insert_formes_table(cur, pkmn)
-        insert_form_descriptions_table(cur, pkmn)
-        insert_form_abilities_table(cur, pkmn)
-        insert_evolutions_table(cur, pkmn)
-    con.commit()
+    # Read both collections into rows for each table so that each
+    # table can be inserted in bulk. The abilities are already unique
+    # in mongodb.
+    ability_fields = {'_id': 0, 'ability': 1, 'description': 1}
+    abilities_rows = [(ability['ability'], ability['description'])
+                      for ability in ability_coll.find(
+                          projection=ability_fields, batch_size=500)]
+    pokemon_rows = []
+    formes_rows = []
+    form_desc_rows = []
+    form_ability_rows = []
+    evolution_families = {}
+    # Skip the pokemon's url and _id and each form's image since
+    # they're not put in the sqlite database.
+    pkmn_fields = {'_id': 0, 'name': 1, 'number': 1, 'evolutions': 1,
+                   'formes.form': 1, 'formes.height': 1, 'formes.weight': 1,
+                   'formes.category': 1, 'formes.types': 1,
+                   'formes.gender': 1, 'formes.descriptions': 1,
+                   'formes.abilities': 1}
+    for pkmn in pkmn_coll.find(projection=pkmn_fields, batch_size=1000):
+        pokemon_rows.append(pokemon_table_values(pkmn))
+        formes_rows.extend(formes_table_values(pkmn))
+        form_desc_rows.extend(form_descriptions_table_values(pkmn))
+        form_ability_rows.extend(form_abilities_table_values(pkmn))
+        # Every pokemon in an evolution line has the same line, so
+        # only work out the evolutions once for each family.
+        family = evolution_family(pkmn)
+        if family not in evolution_families:
+            evolution_families[family] = evolutions_table_values(pkmn)
+    # Drop any evolutions shared between families before they break
+    # the evolutions table's unique index.
+    evolution_rows = dict.fromkeys(
+        evolution for evolutions in evolution_families.values()
+        for evolution in evolutions)
+
+    con = connect_sqlite_db(db_name)
+    # Manage the transaction by hand so that every insert ends up in
+    # one transaction instead of paying for a journal sync each time.
+    con.isolation_level = None
+    # Leaving the with block commits the rows and their keys together,
+    # or rolls all of it back if an insert or a key fails.
+    with con:
+        con.execute("BEGIN;")
+        con.executemany(INSERT_ABILITIES_SQL, abilities_rows)
+        con.executemany(INSERT_POKEMON_SQL, pokemon_rows)
+        con.executemany(INSERT_FORMES_SQL, formes_rows)
+        con.executemany(INSERT_FORM_DESCRIPTIONS_SQL, form_desc_rows)
+        con.executemany(INSERT_FORM_ABILITIES_SQL, form_ability_rows)
+        con.executemany(INSERT_EVOLUTIONS_SQL, evolution_rows)
+        create_sqlite_indexes(con)
     con.close()
 
 
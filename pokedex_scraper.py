@@ -1,6 +1,8 @@
 import requests
-from bs4 import BeautifulSoup
-from pymongo import MongoClient
+from requests.adapters import HTTPAdapter
+from lxml import etree, html
+from pymongo import MongoClient, UpdateOne
+from concurrent.futures import ThreadPoolExecutor
 import random
 import time
 
@@ -19,12 +21,21 @@ class PokedexScraper:
     next_pokemon_url
     """
 
-    def __init__(self, pokemon_url):
+    # The classes of the sections of the page that get scraped.
+    _SECTION_CLASSES = ("pokedex-pokemon-pagination-title", "profile-images",
+                        "version-descriptions", "dtm-type",
+                        "pokemon-ability-info", "evolution-profile",
+                        "pokemon-ability-info-detail", "next")
+
+    def __init__(self, pokemon_url, session=None):
         """
         Parameters
         ----------
         pokemon_url : str
             A pokemon's pokedex page.
+        session : requests.Session, optional
+            A session to fetch the page with so that its connection to
+            the site can be reused between pages.
 
         Raises
         ------
@@ -40,8 +51,10 @@ class PokedexScraper:
             raise ValueError(error_message)
 
         self._url = pokemon_url
-        r = requests.get(self._url)
-        self._soup = BeautifulSoup(r.text, "html.parser")
+        get = session.get if session is not None else requests.get
+        r = get(self._url)
+        self._page = html.fromstring(r.text)
+        self._sections = self.__find_sections()
 
         self._pokemon = self.__scrape_pokemon()
         self._abilities = self.__scrape_abilities()
@@ -67,6 +80,49 @@ class PokedexScraper:
         """Get the url of the next pokemon in the pokedex."""
         return self._next_pokemon_url
 
+    def __find_sections(self):
+        """Find the sections of the page that get scraped.
+
+        The whole page is only walked through once here instead of
+        once for each section.
+
+        Returns
+        -------
+        sections : dictionary
+            The classes of the sections paired with a list 
+            of the elements that have that class, in page order.
+            The element with the id "formes" is paired with "#formes".
+        """
+        sections = {class_name: [] for class_name in self._SECTION_CLASSES}
+        sections["#formes"] = []
+        for element in self._page.iter(etree.Element):
+            if element.get("id") == "formes":
+                sections["#formes"].append(element)
+            for class_name in element.get("class", "").split():
+                if class_name in sections:
+                    sections[class_name].append(element)
+        return sections
+
+    @staticmethod
+    def __find_all_by_class(element, class_name):
+        """Find the elements inside of an element that have a class.
+
+        Parameters
+        ----------
+        element : lxml.html.HtmlElement
+            The element to search inside of.
+        class_name : str
+            The class to search for.
+
+        Returns
+        -------
+        list of lxml.html.HtmlElement
+            The matching elements in page order.
+        """
+        return [descendant
+                for descendant in element.iterdescendants(etree.Element)
+                if class_name in descendant.get("class", "").split()]
+
     def __scrape_pokemon(self):
         """Creates a dictionary containing all of the pokemon's info.
 
@@ -75,18 +131,26 @@ class PokedexScraper:
         pokemon : dictionary
             The pokemon's info scraped from the website.
         """
+        # Find each section of the page once and hand it to the
+        # method that scrapes it.
+        title_tag = self._sections["pokedex-pokemon-pagination-title"][0][0]
+        images_root = self._sections["profile-images"][0]
+        descriptions_tags = self._sections["version-descriptions"]
+        types_tags = self._sections["dtm-type"]
+        info_tags = self._sections["pokemon-ability-info"]
+
         pokemon = {}
         pokemon["url"] = self.url
-        pokemon["name"] = self.__scrape_name()
-        pokemon["number"] = self.__scrape_number()
+        pokemon["name"] = self.__scrape_name(title_tag)
+        pokemon["number"] = self.__scrape_number(title_tag)
         pokemon["evolutions"] = self.__scrape_evolutions()
 
         # Gather the info specific to each form of the pokemon.
-        formes = self.__scrape_formes()
-        images = self.__scrape_images(formes)
-        descriptions = self.__scrape_descriptions(formes)
-        types = self.__scrape_types(formes)
-        misc_info = self.__scrape_misc_info(formes)
+        formes = self.__scrape_formes(pokemon["name"])
+        images = self.__scrape_images(formes, images_root)
+        descriptions = self.__scrape_descriptions(formes, descriptions_tags)
+        types = self.__scrape_types(formes, types_tags)
+        misc_info = self.__scrape_misc_info(formes, info_tags)
 
         # Add the form-specific info to the dictionary.
         pokemon["formes"] = []
@@ -101,50 +165,61 @@ class PokedexScraper:
 
         return pokemon
 
-    def __scrape_name(self):
+    def __scrape_name(self, title_tag):
         """Scrape the name of the pokemon on this page.
 
+        Parameters
+        ----------
+        title_tag : lxml.html.HtmlElement
+            The title of the page holding the pokemon's name and number.
+
         Returns
         -------
         str
             The pokemon's name.
         """
-        pokemon_title = self._soup.find(
-            class_="pokedex-pokemon-pagination-title").contents[1]
-        return pokemon_title.contents[0].strip(" \n")
+        return title_tag.text.strip()
 
-    def __scrape_number(self):
+    def __scrape_number(self, title_tag):
         """Scrape the number of the pokemon on this page.
 
+        Parameters
+        ----------
+        title_tag : lxml.html.HtmlElement
+            The title of the page holding the pokemon's name and number.
+
         Returns
         -------
         int
             The pokemon's number.
         """
-        pokemon_title = self._soup.find(
-            class_="pokedex-pokemon-pagination-title").contents[1]
-        return int(pokemon_title.contents[1].string.strip(" \n#"))
+        return int(title_tag[0].text_content().strip().lstrip("#"))
 
-    def __scrape_formes(self):
+    def __scrape_formes(self, name):
         """Scrape the different formes of the pokemon on this page.
 
         Each pokemon can come in one to several different formes.
 
+        Parameters
+        ----------
+        name : str
+            The pokemon's name, used as the form if there's only one.
+
         Returns
         -------
         formes : list of str
             A list of the formes this pokemon comes in.
         """
         formes = []
-        formes_tag = self._soup.find(id="formes")
-        if formes_tag:
-            for form in formes_tag.contents[1::2]: # Slice to remove newlines
-                formes.append(form.string.strip(" \n"))
+        formes_tags = self._sections["#formes"]
+        if formes_tags:
+            for form in formes_tags[0].iterchildren(etree.Element):
+                formes.append(form.text_content().strip())
         else: # Only one form so use the pokemon's name.
-            formes.append(self.__scrape_name())
+            formes.append(name)
         return formes
 
-    def __scrape_images(self, formes):
+    def __scrape_images(self, formes, images_root):
         """Scrape the urls of images of the pokemon.
 
         There is one image for each form of the pokemon.
@@ -153,6 +228,8 @@ class PokedexScraper:
         ----------
         formes : list of str
             The different formes of this pokemon.
+        images_root : lxml.html.HtmlElement
+            The section of the page holding the images.
 
         Returns
         -------
@@ -161,12 +238,12 @@ class PokedexScraper:
             with the url of their image.
         """
         images = {}
-        images_tag = self._soup.find(class_="profile-images").find_all("img")
+        images_tag = images_root.iterdescendants("img")
         for image, form in zip(images_tag, formes):
-            images[form] = image["src"]
+            images[form] = image.attrib["src"]
         return images
 
-    def __scrape_descriptions(self, formes):
+    def __scrape_descriptions(self, formes, descriptions_tags):
         """Scrape the short biographies of the pokemon
          called descriptions in the site's html.
 
@@ -176,6 +253,8 @@ class PokedexScraper:
         ----------
         formes : list of str
             The different formes of this pokemon.
+        descriptions_tags : list of lxml.html.HtmlElement
+            The sections of the page holding each form's descriptions.
 
         Returns
         -------
@@ -184,15 +263,14 @@ class PokedexScraper:
             with a list of their two descriptions.
         """
         descriptions = {}
-        descriptions_tag = self._soup.find_all(class_="version-descriptions")
-        for two_descriptions, form in zip(descriptions_tag, formes):
+        for two_descriptions, form in zip(descriptions_tags, formes):
             form_descriptions = []
-            for description in two_descriptions.find_all("p"):
-                form_descriptions.append(description.string.strip(" \n"))
+            for description in two_descriptions.iterdescendants("p"):
+                form_descriptions.append(description.text_content().strip())
             descriptions[form] = form_descriptions
         return descriptions
 
-    def __scrape_types(self, formes):
+    def __scrape_types(self, formes, types_tags):
         """Scrape the types of the pokemon.
 
         There are one to two types for each form of the pokemon.
@@ -201,6 +279,8 @@ class PokedexScraper:
         ----------
         formes : list of str
             The different formes of this pokemon.
+        types_tags : list of lxml.html.HtmlElement
+            The sections of the page holding each form's types.
 
         Returns
         -------
@@ -209,15 +289,14 @@ class PokedexScraper:
             with a list of their types.
         """
         types = {}
-        types_tag = self._soup.find_all(class_="dtm-type")
-        for form_types, form in zip(types_tag, formes):
+        for form_types, form in zip(types_tags, formes):
             form_types_list = []
-            for type_ in form_types.find_all("li"):
-                form_types_list.append(type_.text.strip(" \n"))
+            for type_ in form_types.iterdescendants("li"):
+                form_types_list.append(type_.text_content().strip())
             types[form] = form_types_list
         return types
 
-    def __scrape_misc_info(self, formes):
+    def __scrape_misc_info(self, formes, info_tags):
         """Scrape miscellaneous info about the pokemon from
         a table on the site.
 
@@ -227,6 +306,8 @@ class PokedexScraper:
         ----------
         formes : list of str
             The different formes of this pokemon.
+        info_tags : list of lxml.html.HtmlElement
+            The tables of the page holding each form's info.
 
         Returns
         -------
@@ -236,42 +317,44 @@ class PokedexScraper:
             info, such as height, with their values.
         """
         info = {}
-        info_tag = self._soup.find_all(class_="pokemon-ability-info")
 
         # The for loop creates a dictionary of info for each pokemon form.
-        for form_info, form in zip(info_tag, formes):
+        for form_info, form in zip(info_tags, formes):
             # The titles html contains the keys for the dictionary.
-            titles = form_info.find_all(class_="attribute-title")
+            titles = [title.text_content() for title in
+                      self.__find_all_by_class(form_info, "attribute-title")]
             # The values html contains the values for the dictionary.
-            values = form_info.find_all(class_="attribute-value")
+            values_tags = self.__find_all_by_class(form_info,
+                                                   "attribute-value")
+            values = [value.text_content() for value in values_tags]
             info[form] = {}
 
             # Add this form's height and weight.
             for i in range(2):
-                info[form][titles[i].text.lower()] = values[i].text
+                info[form][titles[i].lower()] = values[i]
             
             # Add the possible genders in text form rather than symbols.
             genders = []
-            icons = values[2].find_all(class_="icon")
+            icons = self.__find_all_by_class(values_tags[2], "icon")
             if icons: # If they're symbols.
                 for icon in icons:
-                    if icon.attrs["class"][1].find("female") != -1:
+                    if "female" in icon.get("class", ""):
                         genders.append("Female")
                     else:
                         genders.append("Male")
             else: # If they're text.
-                genders.append(values[2].text.strip(" \n"))
-            info[form][titles[2].text.lower()] = genders
+                genders.append(values[2].strip())
+            info[form][titles[2].lower()] = genders
 
             # Add this form's category.
-            info[form][titles[3].text.lower()] = values[3].text
+            info[form][titles[3].lower()] = values[3]
 
             # Put the abilities in a list.
             if len(titles) > 4 and len(values) > 4:
                 abilities = []
                 for ability in values[4:]:
-                    abilities.append(ability.text.strip(" \n"))
-                info[form][titles[4].text.lower()] = abilities
+                    abilities.append(ability.strip())
+                info[form][titles[4].lower()] = abilities
         return info
             
     def __scrape_evolutions(self):
@@ -284,14 +367,15 @@ class PokedexScraper:
             name of that spot in the evolution line with a list
             of the pokemon in that spot.
         """
-        evolutions_tag = self._soup.find(class_="evolution-profile")
+        evolutions_tags = self._sections["evolution-profile"]
         # Use a list instead of dictionary to preserve order.
         evolutions = []
-        if evolutions_tag:
-            for evo_line_spot in evolutions_tag.contents[1::2]:
-                evo_spot = evo_line_spot.attrs["class"][0]
-                evos_in_spot = [evo.contents[0].strip(" \n") 
-                                for evo in evo_line_spot.find_all("h3")]
+        if evolutions_tags:
+            for evo_line_spot in evolutions_tags[0].iterchildren(
+                    etree.Element):
+                evo_spot = evo_line_spot.get("class").split()[0]
+                evos_in_spot = [evo.text.strip() for evo in 
+                                evo_line_spot.iterdescendants("h3")]
                 evolutions.append({evo_spot: evos_in_spot})
         return evolutions
 
@@ -306,13 +390,12 @@ class PokedexScraper:
         """
         # Gather the abilities and their descriptions in a dictionary.
         abilities = {}
-        for ability_element in self._soup.find_all(
-                class_="pokemon-ability-info-detail"):
-            ability_name = ability_element.find("h3").text.strip(" \n")
+        for ability_element in self._sections["pokemon-ability-info-detail"]:
+            ability_name = ability_element.find(".//h3").text_content().strip()
             # There might be duplicate abilities from different forms.
-            if ability_name not in abilities.keys():
+            if ability_name not in abilities:
                 ability_description = ability_element.find(
-                    "p").text.strip(" \n")
+                    ".//p").text_content().strip()
                 abilities[ability_name] = ability_description
         # Give each ability its own dictionary and return a list of them.
         return [{"ability": ability, "description": description}
@@ -326,7 +409,8 @@ class PokedexScraper:
         str
             The url of the next pokemon in the pokedex.
         """
-        next_pokemon = self._soup.find('a', class_="next")["href"]
+        next_pokemon = next(element for element in self._sections["next"]
+                            if element.tag == "a").attrib["href"]
         return "https://www.pokemon.com" + next_pokemon
 
     def __str__(self):
@@ -334,6 +418,32 @@ class PokedexScraper:
             self.url, self.pokemon, self.abilities, self.next_pokemon_url)
 
 
+def save_pages(pokemon, abilities, pkmn_collection, ability_collection):
+    """
+    Save the info scraped from pokedex pages in the mongodb database.
+
+    Parameters
+    ----------
+    pokemon : list of dictionary
+        The pokemon scraped from the pages.
+    abilities : list of dictionary
+        The abilities scraped from the pages.
+    pkmn_collection : pymongo.collection.Collection
+        The collection to add the pokemon to.
+    ability_collection : pymongo.collection.Collection
+        The collection to add the pokemon's abilities to.
+    """
+    pkmn_collection.insert_many(pokemon, ordered=False)
+    # Pokemon share abilities, so only send each ability once.
+    unique_abilities = {ability["ability"]: ability for ability in abilities}
+    # Send all of the pages' abilities to the database at once.
+    ability_updates = [UpdateOne({"ability": name}, {"$set": ability},
+                                 upsert=True)
+                       for name, ability in unique_abilities.items()]
+    if ability_updates:
+        ability_collection.bulk_write(ability_updates, ordered=False)
+
+
 def main():
     """
     Scrape the entire pokedex and save the data in a mongodb database.
@@ -346,28 +456,53 @@ def main():
     ability_collection = db["abilities"]
     ability_collection.create_index("ability", unique=True)
 
+    # Keep one connection to the site open for all of the pages.
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=1, max_retries=3))
+    session.headers.update({"Accept-Encoding": "gzip"})
+
     first_pokemon_url = "https://www.pokemon.com/us/pokedex/bulbasaur"
     url = first_pokemon_url
     # Scrape the pokedex page of each pokemon and
     # put the info into the mongodb database.
-    while (True):
-        # Wait a fraction of a second in between requests to be
-        # nice to the server.
-        delay = random.random()
-        time.sleep(delay)
-
-        # Scrape a pokedex page and store the info in the database.
-        pkdx = PokedexScraper(url)
-        print(pkdx.pokemon["number"])
-        pkmn_collection.insert_one(pkdx.pokemon)
-        for ability in pkdx.abilities:
-            ability_collection.update_one({"ability": ability["ability"]},
-                                        {"$set": ability}, upsert=True)
-        # The pokedex website wraps around to the beginning.
-        if pkdx.next_pokemon_url == first_pokemon_url:
-            break
-        else:
-            url = pkdx.next_pokemon_url  
+    # The next page's url is only known once a page has been scraped,
+    # so the pages are scraped one at a time. But the pages are saved
+    # in batches on another thread while the next ones are being fetched.
+    pages_per_save = 50
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        save = None
+        pokemon = []
+        abilities = []
+        while (True):
+            # Wait a fraction of a second in between requests to be
+            # nice to the server.
+            delay = random.random()
+            time.sleep(delay)
+
+            # Scrape a pokedex page and store the info in the database.
+            pkdx = PokedexScraper(url, session)
+            print(pkdx.pokemon["number"])
+            pokemon.append(pkdx.pokemon)
+            abilities.extend(pkdx.abilities)
+            if len(pokemon) >= pages_per_save:
+                # Make sure the last batch was saved before saving this one.
+                if save is not None:
+                    save.result()
+                save = executor.submit(save_pages, pokemon, abilities,
+                                       pkmn_collection, ability_collection)
+                pokemon = []
+                abilities = []
+            # The pokedex website wraps around to the beginning.
+            if pkdx.next_pokemon_url == first_pokemon_url:
+                break
+            else:
+                url = pkdx.next_pokemon_url  
+        # Save the pages left over from the last batch.
+        if save is not None:
+            save.result()
+        if pokemon:
+            save_pages(pokemon, abilities, pkmn_collection,
+                       ability_collection)
     print("done")
 
 